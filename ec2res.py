@@ -1,4 +1,4 @@
-#!/usr/bin/python
+#!/usr/bin/env python3
 
 # Report coverage of reserved instances in Amazon EC2 and RDS.
 
@@ -6,7 +6,7 @@
 # as well as any reservations that aren't being used by a running instance.
 # It also reports any upcoming service events that will affect EC2 instances.
 
-# This is a stand-alone script with no dependencies other than Amazon's "boto" library.
+# This is a stand-alone script with no dependencies other than Amazon's "boto3" library.
 
 # Copyright (c) 2015 Battlehouse Inc. All rights reserved.
 # Use of this source code is governed by an MIT-style license that can be
@@ -14,12 +14,25 @@
 
 # Updated for public release by Dan Maas.
 
-import sys, time, datetime, calendar, getopt
-import boto.ec2, boto.rds2
+import sys, time, calendar, getopt, operator
+from collections import defaultdict, deque
 import boto3
+from botocore.config import Config
+from concurrent.futures import ThreadPoolExecutor
 
 time_now = int(time.time())
 
+SECONDS_PER_YEAR = 365*86400
+HOURS_PER_YEAR = 365*24
+
+# the AWS queries run concurrently on this many threads
+QUERY_THREADS = 6
+
+# settings for every boto3 client: adaptive retries smooth out throttling caused by
+# the concurrent queries, and the connection pool is big enough for all query threads
+BOTO_CONFIG = Config(retries = {'max_attempts': 10, 'mode': 'adaptive'},
+                     max_pool_connections = 10)
+
 class NoColor:
     """ For notcolorizing the terminal output """
     @classmethod
@@ -47,60 +60,62 @@ class ANSIColor:
     @classmethod
     def yellow(self, x): return self.YELLOW+x+self.ENDC
 
-def decode_time_string(amztime):
-    """ Translate Amazon API time string to a UNIX timestamp """
-    return calendar.timegm(time.strptime(amztime.split('.')[0], '%Y-%m-%dT%H:%M:%S'))
-
-# Utility to convert a Python datetime to UNIX timestamp
-
-ZERO = datetime.timedelta(0)
-class DummyPythonUTC(datetime.tzinfo):
-    def utcoffset(self, dt): return ZERO
-    def tzname(self, dt): return "UTC"
-    def dst(self, dt): return ZERO
-dummy_python_utc = DummyPythonUTC()
-
 def decode_time_datetime(dt):
     """ Translate Python datetime to UNIX timestamp """
-    ret = dt - datetime.datetime(1970, 1, 1, tzinfo=dummy_python_utc)
-    if hasattr(ret, 'total_seconds'):
-        return ret.total_seconds()
-    # Python 2.6 compatibility
-    return (ret.microseconds + (ret.seconds + ret.days * 24 * 3600) * 10**6) / 10**6
+    # note: naive datetimes are taken to be UTC, not local time as datetime.timestamp() would assume
+    return dt.timestamp() if dt.tzinfo is not None else calendar.timegm(dt.utctimetuple())
 
 # Utilities that operate on objects returned from the AWS API queries
 
 def ec2_inst_is_vpc(inst):
     """ Is this EC2 instance a VPC instance? """
-    return (inst.vpc_id is not None)
+    return (inst.get('VpcId') is not None)
+
+def ec2_inst_placement(inst):
+    """ Return the availability zone of this EC2 instance """
+    return inst['Placement']['AvailabilityZone']
+
+def ec2_inst_name(inst):
+    """ Return the 'Name' tag of this EC2 instance """
+    for tag in inst.get('Tags', []):
+        if tag['Key'] == 'Name':
+            return tag['Value']
+    return ''
 
 def ec2_res_is_vpc(res):
     """ Is this EC2 reservation for a VPC instance? """
     # note: As of March, 2022, AWS has made all reservations VPC reservations
     return True # ('VPC' in res['ProductDescription'])
 
-def ec2_res_match(res, inst):
-    """ Return true if this EC2 reservation can cover this EC2 instance. """
+def ec2_match_key(instance_type, is_vpc, placement = None):
+    """ Build the key that EC2 instances are bucketed under for reservation matching,
+    e.g. 't2.small|1|us-east-1a'. Leave out the placement to get the region-wide key. """
+    key = '%s|%d' % (instance_type, is_vpc)
+    return key if placement is None else key+'|'+placement
+
+def ec2_res_candidates(res, buckets, region_buckets):
+    """ Return the instance buckets that this EC2 reservation can draw from.
+    'buckets' maps zonal match key -> instances, 'region_buckets' maps region-wide match key -> list of those buckets. """
     if res['Scope'] == 'Availability Zone':
-        if res['AvailabilityZone'] != inst.placement:
-            return False
+        key = ec2_match_key(res['InstanceType'], ec2_res_is_vpc(res), res['AvailabilityZone'])
+        return [buckets[key]] if key in buckets else []
     elif res['Scope'] == 'Region':
-        pass
+        return region_buckets.get(ec2_match_key(res['InstanceType'], ec2_res_is_vpc(res)), [])
     else:
         raise Exception('unknown scope for %r' % res)
 
-    return res['InstanceType'] == inst.instance_type and \
-           ec2_res_is_vpc(res) == ec2_inst_is_vpc(inst) and \
-           res['State'] == 'active'
+# (product, engine) pairs where an RDS reservation 'product' covers a running instance 'engine'
+RDS_PRODUCT_ENGINES = frozenset([('postgresql','postgres'),
+                                 ('mysql','mysql'), # note: not sure if this is correct
+                                 ])
 
 def rds_product_engine_match(product, engine):
     """ Check whether an RDS reservation 'product' matches a running instance 'engine' """
-    return (product, engine) in (('postgresql','postgres'),
-                                 ('mysql','mysql'), # note: not sure if this is correct
-                                 )
+    return (product, engine) in RDS_PRODUCT_ENGINES
 
-def rds_res_match(res, inst, rds_offerings):
-    """ Return true if this RDS reservation can cover this RDS instance. """
+def rds_res_candidates(res, rds_offerings, class_buckets):
+    """ Return the instance buckets that this RDS reservation can draw from.
+    'class_buckets' maps (class, multiaz) -> list of (engine, instances). """
     # note: RDS uses slightly different terminology for the reservation "product" vs. the instance "engine"
     if 'ProductDescription' in res:
         product = res['ProductDescription']
@@ -108,23 +123,37 @@ def rds_res_match(res, inst, rds_offerings):
         product = rds_offerings[res['ReservedDBInstancesOfferingId']]['ProductDescription']
     else:
         # no way to find the "product" type
-        return False
+        return []
 
-    engine = inst['Engine']
-    return res['DBInstanceClass'] == inst['DBInstanceClass'] and \
-           rds_product_engine_match(product, engine) and \
-           res['MultiAZ'] == inst['MultiAZ']
+    return [bucket for engine, bucket in class_buckets.get((res['DBInstanceClass'], res['MultiAZ']), [])
+            if rds_product_engine_match(product, engine)]
+
+def pop_first_index(buckets):
+    """ Remove and return the lowest instance index from any of these buckets,
+    or None if they are all empty. """
+    best = None
+    for bucket in buckets:
+        if bucket and (best is None or bucket[0] < best[0]):
+            best = bucket
+    return best.popleft() if best is not None else None
 
 # Pretty-printing utilities for objects returned from the AWS API
 
+# line templates, with the bound format() methods looked up once
+format_ec2_res = '{:<10} {:<7} {:<22} {:>10}  {:>3d} days left'.format
+format_ec2_instance = '{:<24} {:<10} {:<7} {:<11}'.format
+format_rds_res = '{} {:<22} {:<12} {:>10}  {:>3d} days left'.format
+format_rds_instance = '{:<16} {:<10} {} {:<13} {:<8}'.format
+format_price = '${:.0f}/yr'.format
+
 def pretty_print_ec2_res_price(res):
     """ Pretty-print price of an EC2 reservation """
-    yearly = float(res['FixedPrice']) * (365*86400)/float(res['Duration'])
+    yearly = float(res['FixedPrice']) * SECONDS_PER_YEAR/float(res['Duration'])
     for charge in res['RecurringCharges']:
         assert charge['Frequency'] == 'Hourly'
-        yearly += float(charge['Amount']) * (365*24)
-    yearly += float(res['UsagePrice']) * (365*24) # ???
-    return '$%.0f/yr' % yearly
+        yearly += float(charge['Amount']) * HOURS_PER_YEAR
+    yearly += float(res['UsagePrice']) * HOURS_PER_YEAR # ???
+    return format_price(yearly)
 
 def pretty_print_ec2_res_where(res):
     """ Pretty-print zonal placement of an EC2 reservation """
@@ -146,7 +175,7 @@ def pretty_print_ec2_res(res, override_count = None, my_index = None):
     else:
         instance_count = override_count if override_count is not None else res['InstanceCount']
         count = ' (x%d)' % instance_count if (instance_count!=1 or override_count is not None) else ''
-    return '%-10s %-7s %-22s %10s  %3d days left' % (pretty_print_ec2_res_where(res), is_vpc, res['InstanceType']+count, pretty_print_ec2_res_price(res), days)
+    return format_ec2_res(pretty_print_ec2_res_where(res), is_vpc, res['InstanceType']+count, pretty_print_ec2_res_price(res), int(days))
 
 def pretty_print_ec2_res_id(res):
     """ Pretty-print the EC2 reservation ID """
@@ -155,23 +184,25 @@ def pretty_print_ec2_res_id(res):
 def pretty_print_ec2_instance(inst):
     """ Pretty-print a running EC2 instance """
     is_vpc = '--VPC--' if ec2_inst_is_vpc(inst) else 'Classic'
-    return '%-24s %-10s %-7s %-11s' % (inst.tags['Name'], inst.placement, is_vpc, inst.instance_type)
+    return format_ec2_instance(ec2_inst_name(inst), ec2_inst_placement(inst), is_vpc, inst['InstanceType'])
 
 def pretty_print_rds_offering_price(offer):
     """ Pretty-print the price of an RDS reserved offering """
-    yearly = float(offer['FixedPrice']) * (365*86400)/float(offer['Duration'])
+    yearly = float(offer['FixedPrice']) * SECONDS_PER_YEAR/float(offer['Duration'])
     for charge in offer['RecurringCharges']:
         assert charge['RecurringChargeFrequency'] == 'Hourly'
-        yearly += float(charge['RecurringChargeAmount']) * (365*24)
-    yearly += float(offer['UsagePrice']) * (365*24) # ???
-    return '$%.0f/yr' % yearly
+        yearly += float(charge['RecurringChargeAmount']) * HOURS_PER_YEAR
+    yearly += float(offer['UsagePrice']) * HOURS_PER_YEAR # ???
+    return format_price(yearly)
+
+MULTIAZ_NAMES = ('NoMulti', 'MultiAZ')
 
 def pretty_print_multiaz(flag):
-    return 'MultiAZ' if flag else 'NoMulti'
+    return MULTIAZ_NAMES[bool(flag)]
 
 def pretty_print_rds_res(res, rds_offerings, override_count = None, my_index = None):
     """ Pretty-print an RDS reservation """
-    lifetime = res['StartTime'] + res['Duration'] - time_now
+    lifetime = decode_time_datetime(res['StartTime']) + res['Duration'] - time_now
     days = lifetime//86400
     if my_index is not None and res['DBInstanceCount'] > 1:
         count = ' (%d of %d)' % (my_index+1, res['DBInstanceCount'])
@@ -179,27 +210,56 @@ def pretty_print_rds_res(res, rds_offerings, override_count = None, my_index = N
         instance_count = override_count if override_count is not None else res['DBInstanceCount']
         count = ' (x%d)' % instance_count if (instance_count!=1 or override_count is not None) else ''
     #offer = rds_offerings.get(res['ReservedDBInstancesOfferingId'])
-    return '%s %-22s %-12s %10s  %3d days left' % (pretty_print_multiaz(res['MultiAZ']), res['DBInstanceClass']+count,
-                                                   res['ProductDescription'], # offer['ProductDescription'] if offer else 'UNKNOWN'),
-                                                   pretty_print_rds_offering_price(res), # pretty_print_rds_offering_price(offer) if offer else '?',
-                                                   days)
+    return format_rds_res(pretty_print_multiaz(res['MultiAZ']), res['DBInstanceClass']+count,
+                          res['ProductDescription'], # offer['ProductDescription'] if offer else 'UNKNOWN'),
+                          pretty_print_rds_offering_price(res), # pretty_print_rds_offering_price(offer) if offer else '?',
+                          int(days))
 
 def pretty_print_rds_instance(inst):
     """ Pretty-print a running RDS instance """
-    return '%-16s %-10s %s %-13s %-8s' % (inst['DBInstanceIdentifier'], inst['AvailabilityZone'], pretty_print_multiaz(inst['MultiAZ']), inst['DBInstanceClass'], inst['Engine'])
+    return format_rds_instance(inst['DBInstanceIdentifier'], inst['AvailabilityZone'], pretty_print_multiaz(inst['MultiAZ']), inst['DBInstanceClass'], inst['Engine'])
+
+def get_ec2_instances(ec2):
+    """ Query EC2 API for the running instances """
+    ret = []
+    paginator = ec2.get_paginator('describe_instances')
+    for page in paginator.paginate(Filters = [{'Name':'instance-state-name','Values':['running']}],
+                                   PaginationConfig = {'PageSize': 1000}):
+        for reservation in page['Reservations']:
+            ret += reservation['Instances']
+    return ret
+
+def get_ec2_reservations(ec2):
+    """ Query EC2 API for the active reservations """
+    # note: DescribeReservedInstances is not paginated, it always returns the full result set
+    return ec2.describe_reserved_instances(Filters = [{'Name':'state','Values':['active']}])['ReservedInstances']
+
+def get_ec2_instance_status(ec2, instance_ids):
+    """ Query EC2 API for the status (including scheduled events) of these instances """
+    ret = []
+    paginator = ec2.get_paginator('describe_instance_status')
+    # note: the API accepts at most 100 instance IDs per request
+    for i in range(0, len(instance_ids), 100):
+        for page in paginator.paginate(InstanceIds = instance_ids[i:i+100], IncludeAllInstances = False):
+            ret += page['InstanceStatuses']
+    return ret
+
+def get_rds_instances(rds):
+    """ Query RDS API for the running instances """
+    return [inst for page in rds.get_paginator('describe_db_instances').paginate()
+            for inst in page['DBInstances']]
+
+def get_rds_reservations(rds):
+    """ Query RDS API for the active reservations """
+    # note: the RDS API has no server-side filter on reservation state
+    return [res for page in rds.get_paginator('describe_reserved_db_instances').paginate()
+            for res in page['ReservedDBInstances'] if res['State'] == 'active']
 
 def get_rds_res_offerings(rds):
     """ Query RDS API for the reserved offerings """
-    ret = {}
-    marker = None
-    while True:
-        r = rds.describe_reserved_db_instances_offerings(marker=marker)['DescribeReservedDBInstancesOfferingsResponse']['DescribeReservedDBInstancesOfferingsResult']
-        rlist = r['ReservedDBInstancesOfferings']
-        marker = r['Marker']
-        for x in rlist: ret[x['ReservedDBInstancesOfferingId']] = x
-        if not rlist or not marker:
-            break
-    return ret
+    return dict((offer['ReservedDBInstancesOfferingId'], offer)
+                for page in rds.get_paginator('describe_reserved_db_instances_offerings').paginate()
+                for offer in page['ReservedDBInstancesOfferings'])
 
 if __name__ == '__main__':
     opts, args = getopt.gnu_getopt(sys.argv[1:], 'v', ['region=','color='])
@@ -213,116 +273,141 @@ if __name__ == '__main__':
 
     colors = ANSIColor if use_color else NoColor
 
-    conn = boto.ec2.connect_to_region(region)
-    conn3 = boto3.client('ec2', region_name = region)
-    rds = boto.rds2.connect_to_region(region)
-
-    # query EC2 instances and reservations
-    ec2_instance_list = conn.get_only_instances()
-    ec2_res_list = conn3.describe_reserved_instances(Filters = [{'Name':'state','Values':['active']}])['ReservedInstances']
-    ec2_status_list = conn.get_all_instance_status()
-
-    # query RDS instances and reservations
-    rds_instance_list = rds.describe_db_instances()['DescribeDBInstancesResponse']['DescribeDBInstancesResult']['DBInstances']
-    rds_res_list = rds.describe_reserved_db_instances()['DescribeReservedDBInstancesResponse']['DescribeReservedDBInstancesResult']['ReservedDBInstances']
-
-    rds_res_offerings = get_rds_res_offerings(rds)
-
-    # only show running instances, and sort by name
-    ec2_instance_list = sorted(filter(lambda x: x.state=='running' and not x.spot_instance_request_id,
-                                      ec2_instance_list), key = lambda x: x.tags['Name'])
-    rds_instance_list.sort(key = lambda x: x['DBInstanceIdentifier'])
-
-    # disregard expired reservations
-    ec2_res_list = filter(lambda x: x['State']=='active', ec2_res_list)
-    rds_res_list = filter(lambda x: x['State']=='active', rds_res_list)
-
-    # maps instance ID -> reservation that covers it
-    ec2_res_coverage = dict((inst.id, None) for inst in ec2_instance_list)
-    rds_res_coverage = dict((inst['DBInstanceIdentifier'], None) for inst in rds_instance_list)
+    ec2 = boto3.client('ec2', region_name = region, config = BOTO_CONFIG)
+    rds = boto3.client('rds', region_name = region, config = BOTO_CONFIG)
+
+    # the queries are independent and network-bound, so issue them all concurrently
+    with ThreadPoolExecutor(max_workers = QUERY_THREADS) as executor:
+        # query EC2 instances and reservations
+        f_ec2_instance_list = executor.submit(get_ec2_instances, ec2)
+        f_ec2_res_list = executor.submit(get_ec2_reservations, ec2)
+
+        # query RDS instances and reservations
+        f_rds_instance_list = executor.submit(get_rds_instances, rds)
+        f_rds_res_list = executor.submit(get_rds_reservations, rds)
+        f_rds_res_offerings = executor.submit(get_rds_res_offerings, rds)
+
+        # query EC2 instance status, only for the running instances (so this waits on that query)
+        f_ec2_status_list = executor.submit(lambda: get_ec2_instance_status(ec2, [inst['InstanceId'] for inst in f_ec2_instance_list.result()]))
+
+    ec2_instance_list = f_ec2_instance_list.result()
+    ec2_res_list = f_ec2_res_list.result()
+    ec2_status_list = f_ec2_status_list.result()
+    rds_instance_list = f_rds_instance_list.result()
+    rds_res_list = f_rds_res_list.result()
+    rds_res_offerings = f_rds_res_offerings.result()
+
+    # only show on-demand instances (the query already filtered for running ones), and sort by name
+    # (look up each name once, rather than scanning the tags on every comparison)
+    ec2_instance_list = [inst for name, inst in sorted(((ec2_inst_name(inst), inst) for inst in ec2_instance_list
+                                                        if not inst.get('SpotInstanceRequestId')),
+                                                       key = operator.itemgetter(0))]
+    rds_instance_list.sort(key = operator.itemgetter('DBInstanceIdentifier'))
+
+    # maps instance index -> reservation that covers it
+    ec2_res_coverage = [None] * len(ec2_instance_list)
+    rds_res_coverage = [None] * len(rds_instance_list)
+
+    # maps instance index -> its position among the instances covered by that reservation
+    ec2_res_index = [None] * len(ec2_instance_list)
+    rds_res_index = [None] * len(rds_instance_list)
 
     # maps reservation ID -> list of instances that it covers
     ec2_res_usage = dict((res['ReservedInstancesId'], []) for res in ec2_res_list)
     rds_res_usage = dict((res['ReservedDBInstanceId'], []) for res in rds_res_list)
 
+    # compute the attributes that reservations match on once per instance, parallel to the instance lists
+    ec2_inst_keys = [(inst['InstanceType'], ec2_inst_is_vpc(inst), ec2_inst_placement(inst)) for inst in ec2_instance_list]
+    rds_inst_keys = [(inst['DBInstanceClass'], inst['MultiAZ'], inst['Engine']) for inst in rds_instance_list]
+
+    # bucket the instance indices by those attributes, so that each reservation only
+    # looks at instances it could cover. Buckets are in sorted order, and covered
+    # instances are popped off, so that reservations are still assigned to the first
+    # uncovered instance in sort order.
+    ec2_buckets = defaultdict(deque) # "type|is_vpc|placement" -> instance indices
+    ec2_region_buckets = defaultdict(list) # "type|is_vpc" -> list of buckets in any placement
+    for index, (instance_type, is_vpc, placement) in enumerate(ec2_inst_keys):
+        key = ec2_match_key(instance_type, is_vpc, placement)
+        if key not in ec2_buckets:
+            ec2_region_buckets[ec2_match_key(instance_type, is_vpc)].append(ec2_buckets[key])
+        ec2_buckets[key].append(index)
+
+    rds_buckets = defaultdict(deque) # (class, multiaz, engine) -> instance indices
+    rds_class_buckets = defaultdict(list) # (class, multiaz) -> list of (engine, bucket)
+    for index, key in enumerate(rds_inst_keys):
+        if key not in rds_buckets:
+            rds_class_buckets[key[:2]].append((key[2], rds_buckets[key]))
+        rds_buckets[key].append(index)
+
     # figure out which instances are currently covered by reservations
     for res in ec2_res_list:
-        for i in xrange(res['InstanceCount']):
-            for inst in ec2_instance_list:
-                if ec2_res_coverage[inst.id]: continue # instance already covered
-                if ec2_res_match(res, inst):
-                    ec2_res_coverage[inst.id] = res
-                    ec2_res_usage[res['ReservedInstancesId']].append(inst)
-                    break
+        candidates = ec2_res_candidates(res, ec2_buckets, ec2_region_buckets)
+        for i in range(res['InstanceCount']):
+            index = pop_first_index(candidates)
+            if index is None: break # no more matching instances
+            usage = ec2_res_usage[res['ReservedInstancesId']]
+            ec2_res_coverage[index] = res
+            ec2_res_index[index] = len(usage)
+            usage.append(ec2_instance_list[index])
 
     for res in rds_res_list:
-        for i in xrange(res['DBInstanceCount']):
-            for inst in rds_instance_list:
-                if rds_res_coverage[inst['DBInstanceIdentifier']]: continue # instance already covered
-                if rds_res_match(res, inst, rds_res_offerings):
-                    rds_res_coverage[inst['DBInstanceIdentifier']] = res
-                    rds_res_usage[res['ReservedDBInstanceId']].append(inst)
-                    break
+        candidates = rds_res_candidates(res, rds_res_offerings, rds_class_buckets)
+        for i in range(res['DBInstanceCount']):
+            index = pop_first_index(candidates)
+            if index is None: break # no more matching instances
+            usage = rds_res_usage[res['ReservedDBInstanceId']]
+            rds_res_coverage[index] = res
+            rds_res_index[index] = len(usage)
+            usage.append(rds_instance_list[index])
 
     # map instance ID -> upcoming service events
     ec2_instance_status = {}
     for stat in ec2_status_list:
-        if stat.events:
-            for event in stat.events:
-                if '[Canceled]' in event.description or '[Completed]' in event.description: continue
-                if stat.id not in ec2_instance_status: ec2_instance_status[stat.id] = []
-                msg = event.description
-                for timestring in (event.not_before,): # event.not_after):
-                    ts = decode_time_string(timestring)
-                    days_until = (ts - time_now)//86400
-                    st = time.gmtime(ts)
-                    msg += ' in %d days (%s/%d)' % (days_until, st.tm_mon, st.tm_mday)
-                ec2_instance_status[stat.id].append(msg)
+        for event in stat.get('Events', []):
+            if '[Canceled]' in event['Description'] or '[Completed]' in event['Description']: continue
+            if stat['InstanceId'] not in ec2_instance_status: ec2_instance_status[stat['InstanceId']] = []
+            msg = event['Description']
+            for when in (event['NotBefore'],): # event['NotAfter']):
+                ts = decode_time_datetime(when)
+                days_until = (ts - time_now)//86400
+                st = time.gmtime(ts)
+                msg += ' in %d days (%s/%d)' % (days_until, st.tm_mon, st.tm_mday)
+            ec2_instance_status[stat['InstanceId']].append(msg)
 
     # print console output
+    # (lines are collected and written once per section, rather than with one print() per line)
 
-    print 'EC2 INSTANCES:'
-    for inst in ec2_instance_list:
-        res = ec2_res_coverage[inst.id]
+    out = ['EC2 INSTANCES:']
+    for inst, res, my_index in zip(ec2_instance_list, ec2_res_coverage, ec2_res_index):
         if res:
-            my_index = ec2_res_usage[res['ReservedInstancesId']].index(inst)
-            print colors.green(pretty_print_ec2_instance(inst)+' '+pretty_print_ec2_res(res, my_index = my_index)), pretty_print_ec2_res_id(res),
+            line = [colors.green(pretty_print_ec2_instance(inst)+' '+pretty_print_ec2_res(res, my_index = my_index)), pretty_print_ec2_res_id(res)]
         else:
-            print colors.red(pretty_print_ec2_instance(inst)+' NOT COVERED'),
-        if inst.id in ec2_instance_status:
-            print colors.yellow('EVENTS! '+','.join(ec2_instance_status[inst.id])),
-        print
+            line = [colors.red(pretty_print_ec2_instance(inst)+' NOT COVERED')]
+        if inst['InstanceId'] in ec2_instance_status:
+            line.append(colors.yellow('EVENTS! '+','.join(ec2_instance_status[inst['InstanceId']])))
+        out.append(' '.join(line))
 
-    ec2_any_unused = False
-    print 'EC2 UNUSED RESERVATIONS:',
+    ec2_unused = []
     for res in ec2_res_list:
         use_count = len(ec2_res_usage[res['ReservedInstancesId']])
         if use_count >= res['InstanceCount']: continue
-        if not ec2_any_unused:
-            print
-            ec2_any_unused = True
-        print colors.red(pretty_print_ec2_res(res, override_count = res['InstanceCount'] - use_count)), pretty_print_ec2_res_id(res)
-    if not ec2_any_unused:
-        print '(none)'
-
-    print 'RDS INSTANCES:'
-    for inst in rds_instance_list:
-        res = rds_res_coverage[inst['DBInstanceIdentifier']]
+        ec2_unused.append(colors.red(pretty_print_ec2_res(res, override_count = res['InstanceCount'] - use_count))+' '+pretty_print_ec2_res_id(res))
+    out.append('EC2 UNUSED RESERVATIONS:' + ('' if ec2_unused else ' (none)'))
+    out += ec2_unused
+    sys.stdout.write('\n'.join(out)+'\n')
+
+    out = ['RDS INSTANCES:']
+    for inst, res, my_index in zip(rds_instance_list, rds_res_coverage, rds_res_index):
         if res:
-            my_index = rds_res_usage[res['ReservedDBInstanceId']].index(inst)
-            print colors.green(pretty_print_rds_instance(inst)+' '+pretty_print_rds_res(res, rds_res_offerings, my_index = my_index)),
+            out.append(colors.green(pretty_print_rds_instance(inst)+' '+pretty_print_rds_res(res, rds_res_offerings, my_index = my_index)))
         else:
-            print colors.red(pretty_print_rds_instance(inst)+' NOT COVERED'),
-        print
+            out.append(colors.red(pretty_print_rds_instance(inst)+' NOT COVERED'))
 
-    rds_any_unused = False
-    print 'RDS UNUSED RESERVATIONS:',
+    rds_unused = []
     for res in rds_res_list:
         use_count = len(rds_res_usage[res['ReservedDBInstanceId']])
         if use_count >= res['DBInstanceCount']: continue
-        if not rds_any_unused:
-            print
-            rds_any_unused = True
-        print colors.red(pretty_print_rds_res(res, rds_res_offerings, override_count = res['DBInstanceCount'] - use_count)), res['ReservedDBInstanceId']
-    if not rds_any_unused:
-        print '(none)'
+        rds_unused.append(colors.red(pretty_print_rds_res(res, rds_res_offerings, override_count = res['DBInstanceCount'] - use_count))+' '+res['ReservedDBInstanceId'])
+    out.append('RDS UNUSED RESERVATIONS:' + ('' if rds_unused else ' (none)'))
+    out += rds_unused
+    sys.stdout.write('\n'.join(out)+'\n')